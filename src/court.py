@@ -1,8 +1,11 @@
 import asyncio
+import collections
+import hashlib
 import json
 import logging
 import os
 import random
+import string
 import sys
 import time
 
@@ -34,11 +37,47 @@ LOGGER = logging.getLogger(__name__)
 
 TAILS_FILE_COUNT = int(os.getenv("TAILS_FILE_COUNT", 20))
 
+CHECKPOINT_FILE = os.getenv("CHECKPOINT_FILE", ".court-checkpoint.json")
+CHECKPOINT_INTERVAL = float(os.getenv("CHECKPOINT_INTERVAL", 30))
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", 10))
+
+GENESIS_CACHE_FILE = os.getenv("GENESIS_CACHE_FILE", ".court-genesis.json")
+# age in seconds after which a cached genesis copy is refreshed in the background;
+# the refreshed copy is only used from the next start
+GENESIS_REFRESH_INTERVAL = float(os.getenv("GENESIS_REFRESH_INTERVAL", 86400))
+# environment variables default_genesis_txns() uses to pick the ledger
+GENESIS_SOURCE_VARS = (
+    "GENESIS_URL",
+    "GENESIS_FILE",
+    "LEDGER_URL",
+    "RUNMODE",
+    "DOCKERHOST",
+)
+
+MESSAGE_LOG_SIZE = int(os.getenv("MESSAGE_LOG_SIZE", 1000))
+# maximum number of basic messages started per second during a broadcast
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 10))
+if BROADCAST_RATE <= 0:
+    raise ValueError(f"BROADCAST_RATE must be positive, got {BROADCAST_RATE}")
+
+# issuer-side exchange states that need no further action from the court
+CRED_DONE_STATES = ("credential_issued", "credential_acked")
+
 
 class CourtAgent(DemoAgent):
     def __init__(
-            self, http_port: int, admin_port: int, no_auto: bool = False, **kwargs
+            self,
+            http_port: int,
+            admin_port: int,
+            no_auto: bool = False,
+            checkpoint: dict = None,
+            **kwargs
     ):
+        if checkpoint:
+            # reopen the same wallet instead of provisioning a new one
+            kwargs.setdefault("seed", checkpoint.get("seed"))
+            kwargs.setdefault("wallet_name", checkpoint["wallet_name"])
+            kwargs.setdefault("wallet_key", checkpoint["wallet_key"])
         super().__init__(
             "Court.Agent",
             http_port,
@@ -55,6 +94,109 @@ class CourtAgent(DemoAgent):
         # TODO define a dict to hold credential attributes
         # based on credential_definition_id
         self.cred_attrs = {}
+        self.credential_definition_id = None
+        self.cred_def_revocation = None
+        self._in_flight = set()
+        self.message_log = collections.deque(maxlen=MESSAGE_LOG_SIZE)
+        if checkpoint:
+            self.restore_state(checkpoint)
+
+    def checkpoint_state(self) -> dict:
+        # the file is owner-only; the seed rebuilds the DID if the wallet is lost
+        return {
+            "seed": self.seed,
+            "wallet_name": self.wallet_name,
+            "wallet_key": self.wallet_key,
+            "did": self.did,
+            "connection_id": self.connection_id,
+            "credential_definition_id": self.credential_definition_id,
+            "revocation": self.cred_def_revocation,
+            "cred_state": dict(self.cred_state),
+            "cred_attrs": dict(self.cred_attrs),
+        }
+
+    def restore_state(self, state: dict):
+        self.did = state.get("did")
+        self.connection_id = state.get("connection_id")
+        self.credential_definition_id = state.get("credential_definition_id")
+        self.cred_def_revocation = state.get("revocation")
+        self.cred_state = dict(state.get("cred_state") or {})
+        self.cred_attrs = dict(state.get("cred_attrs") or {})
+
+    async def verify_restored_state(self) -> bool:
+        # the wallet may have been recreated, or the ledger changed, since the
+        # checkpoint was written; returns False if the checkpoint is unusable
+        if not self.did:
+            return True
+        public_did = (await self.admin_GET("/wallet/did/public")).get("result")
+        if not public_did or public_did["did"] != self.did:
+            self.log("Checkpoint DID", self.did, "is not the wallet's public DID")
+            if not self.seed:
+                return False
+            self.did = None
+            self.credential_definition_id = None
+            self.cred_def_revocation = None
+            await self.register_did()
+            if not public_did or public_did["did"] != self.did:
+                return False
+        if self.credential_definition_id:
+            created = await self.admin_GET(
+                "/credential-definitions/created"
+                f"?cred_def_id={self.credential_definition_id}"
+            )
+            if self.credential_definition_id not in created.get(
+                    "credential_definition_ids", []
+            ):
+                self.log(
+                    "Checkpoint cred def",
+                    self.credential_definition_id,
+                    "is not in the wallet",
+                )
+                self.credential_definition_id = None
+                self.cred_def_revocation = None
+        return True
+
+    async def resume_connection(self) -> bool:
+        if not self.connection_id:
+            return False
+        try:
+            connection = await self.admin_GET(f"/connections/{self.connection_id}")
+        except ClientError:
+            self.connection_id = None
+            return False
+        if connection.get("state") not in ["active", "response"]:
+            return False
+        self.log("Connected")
+        if not self._connection_ready.done():
+            self._connection_ready.set_result(True)
+        return True
+
+    async def resume_exchanges(self):
+        pending = [
+            cred_ex_id
+            for (cred_ex_id, state) in self.cred_state.items()
+            if state not in CRED_DONE_STATES
+        ]
+        for cred_ex_id in pending:
+            try:
+                record = await self.admin_GET(
+                    f"/issue-credential/records/{cred_ex_id}"
+                )
+            except ClientError:
+                # record is gone from the agent, nothing left to resume
+                self.cred_state.pop(cred_ex_id, None)
+                continue
+            if self.cred_state.get(cred_ex_id) in CRED_DONE_STATES:
+                continue  # completed by a webhook while fetching the record
+            await self.handle_issue_credential(record, resume=True)
+
+    async def drain_exchanges(self, timeout: float = DRAIN_TIMEOUT):
+        if not self._in_flight:
+            return
+        log_msg(f"Waiting for {len(self._in_flight)} in-flight exchange(s)...")
+        _, pending = await asyncio.wait(list(self._in_flight), timeout=timeout)
+        if pending:
+            LOGGER.warning("%d exchange(s) still in flight at shutdown", len(pending))
 
     async def detect_connection(self):
         await self._connection_ready
@@ -67,15 +209,14 @@ class CourtAgent(DemoAgent):
         if message["connection_id"] == self.connection_id:
             if message["state"] in ["active", "response"]:
                 self.log("Connected")
-                self._connection_ready.set_result(True)
                 if not self._connection_ready.done():
                     self._connection_ready.set_result(True)
 
-    async def handle_issue_credential(self, message):
+    async def handle_issue_credential(self, message, resume: bool = False):
         state = message["state"]
         credential_exchange_id = message["credential_exchange_id"]
         prev_state = self.cred_state.get(credential_exchange_id)
-        if prev_state == state:
+        if prev_state == state and not resume:
             return  # ignore
         self.cred_state[credential_exchange_id] = state
 
@@ -95,10 +236,16 @@ class CourtAgent(DemoAgent):
                     {"name": n, "value": v} for (n, v) in cred_attrs.items()
                 ],
             }
+            task = asyncio.ensure_future(
+                self.issue_credential(cred_preview, credential_exchange_id)
+            )
+            self._in_flight.add(task)
             try:
-                await self.issue_credential(cred_preview, credential_exchange_id)
+                await task
             except ClientError:
                 pass
+            finally:
+                self._in_flight.discard(task)
 
     async def issue_credential(self, cred_preview, credential_exchange_id):
 
@@ -133,6 +280,277 @@ class CourtAgent(DemoAgent):
 
     async def handle_basicmessages(self, message):
         self.log("Received message:", message["content"])
+        self.message_log.append(
+            {
+                "connection_id": message.get("connection_id"),
+                "message_id": message.get("message_id"),
+                "sent_time": message.get("sent_time"),
+                "received_time": time.time(),
+                "content": message["content"],
+            }
+        )
+
+    def search_messages(self, text: str = None, connection_id: str = None):
+        return [
+            entry
+            for entry in self.message_log
+            if (not connection_id or entry["connection_id"] == connection_id)
+            and (not text or text.lower() in entry["content"].lower())
+        ]
+
+    async def active_connections(self):
+        connections = await self.admin_GET("/connections?state=active")
+        return connections["results"]
+
+    async def broadcast_message(
+            self, template: str, connection_ids=None, rate: float = BROADCAST_RATE
+    ):
+        # $-placeholders are filled from each connection record, e.g. $their_label;
+        # braces are sent unchanged and $$ gives a literal $
+        if rate <= 0:
+            raise ValueError(f"Broadcast rate must be positive, got {rate}")
+        template = string.Template(template)
+        start = time.perf_counter()
+        if connection_ids is not None and not connection_ids:
+            return {"delivered": 0, "failed": 0, "failures": {}, "duration": 0.0}
+
+        connections = await self.active_connections()
+        failures = {}
+        if connection_ids is not None:
+            active_ids = {conn["connection_id"] for conn in connections}
+            failures = {
+                connection_id: "not an active connection"
+                for connection_id in connection_ids
+                if connection_id not in active_ids
+            }
+            connections = [
+                conn for conn in connections if conn["connection_id"] in connection_ids
+            ]
+
+        # render every message before sending anything, so a malformed template
+        # (e.g. a lone "$") fails up front instead of once per holder
+        contents = {}
+        for conn in list(connections):
+            try:
+                contents[conn["connection_id"]] = template.substitute(conn)
+            except KeyError as err:
+                failures[conn["connection_id"]] = f"missing field {err.args[0]}"
+                connections.remove(conn)
+            except ValueError as err:
+                raise ValueError(f"Bad message template, use $$ for a literal $: {err}")
+
+        async def send(index, connection):
+            # space out the start of each send to stay under the rate limit
+            await asyncio.sleep(index / rate)
+            await self.admin_POST(
+                f"/connections/{connection['connection_id']}/send-message",
+                {"content": contents[connection["connection_id"]]},
+            )
+
+        results = await asyncio.gather(
+            *[send(i, conn) for (i, conn) in enumerate(connections)],
+            return_exceptions=True,
+        )
+        send_failures = {
+            conn["connection_id"]: str(result) or type(result).__name__
+            for (conn, result) in zip(connections, results)
+            if isinstance(result, Exception)
+        }
+        failures.update(send_failures)
+        return {
+            "delivered": len(connections) - len(send_failures),
+            "failed": len(failures),
+            "failures": failures,
+            "duration": time.perf_counter() - start,
+        }
+
+
+def load_checkpoint(path: str) -> dict:
+    try:
+        with open(path) as checkpoint_file:
+            return json.load(checkpoint_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        LOGGER.exception("Ignoring unreadable checkpoint %s:", path)
+        return None
+
+
+def write_json_file(path: str, data: dict):
+    # write to a temporary file first so a crash never leaves a torn file
+    tmp_path = path + ".tmp"
+    try:
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
+    # owner-only, the checkpoint holds the wallet key
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as json_file:
+        json.dump(data, json_file)
+    os.replace(tmp_path, path)
+
+
+def save_checkpoint(path: str, state: dict):
+    write_json_file(path, state)
+
+
+def genesis_checksum(genesis: str) -> str:
+    return hashlib.sha256(genesis.encode("utf-8")).hexdigest()
+
+
+def genesis_source() -> dict:
+    return {name: os.getenv(name) for name in GENESIS_SOURCE_VARS}
+
+
+def valid_genesis(genesis: str) -> bool:
+    # every non-blank line must be a JSON genesis transaction
+    lines = [line for line in genesis.splitlines() if line.strip()]
+    try:
+        return bool(lines) and all(
+            isinstance(json.loads(line).get("txn"), dict) for line in lines
+        )
+    except (ValueError, AttributeError):
+        return False
+
+
+def load_genesis_cache(path: str):
+    # returns (genesis, fetched_at), or (None, None) if missing, corrupt or
+    # fetched from a different ledger
+    try:
+        with open(path) as cache_file:
+            cache = json.load(cache_file)
+        genesis = cache["genesis"]
+        if cache.get("source") != genesis_source():
+            LOGGER.info("Genesis cache %s is for a different ledger", path)
+        elif genesis and genesis_checksum(genesis) == cache["sha256"]:
+            return genesis, float(cache["fetched_at"])
+        else:
+            LOGGER.warning("Genesis cache %s failed checksum verification", path)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError):
+        LOGGER.exception("Ignoring unreadable genesis cache %s:", path)
+    return None, None
+
+
+def save_genesis_cache(path: str, genesis: str):
+    write_json_file(
+        path,
+        {
+            "sha256": genesis_checksum(genesis),
+            "fetched_at": time.time(),
+            "source": genesis_source(),
+            "genesis": genesis,
+        },
+    )
+
+
+async def refresh_genesis_cache(path: str) -> str:
+    genesis = await default_genesis_txns()
+    if genesis and not valid_genesis(genesis):
+        LOGGER.error("Not caching invalid ledger genesis transactions")
+        return None
+    if genesis:
+        try:
+            save_genesis_cache(path, genesis)
+        except OSError:
+            LOGGER.exception("Error writing genesis cache:")
+    return genesis
+
+
+# strong references to background refresh tasks until they finish
+_genesis_refreshes = set()
+
+
+def _genesis_refresh_done(task):
+    _genesis_refreshes.discard(task)
+    if not task.cancelled() and task.exception():
+        LOGGER.error("Error refreshing genesis cache:", exc_info=task.exception())
+
+
+async def load_genesis(
+        cache_file: str = GENESIS_CACHE_FILE,
+        refresh_interval: float = GENESIS_REFRESH_INTERVAL,
+        offline: bool = False,
+):
+    if not cache_file:
+        return None if offline else await default_genesis_txns()
+
+    genesis, fetched_at = load_genesis_cache(cache_file)
+    if genesis:
+        if not offline and time.time() - fetched_at > refresh_interval:
+            # serve the cached copy now, the refreshed one is used next start
+            task = asyncio.ensure_future(refresh_genesis_cache(cache_file))
+            _genesis_refreshes.add(task)
+            task.add_done_callback(_genesis_refresh_done)
+        return genesis
+    if offline:
+        return None
+    return await refresh_genesis_cache(cache_file)
+
+
+async def checkpoint_loop(agent, path: str, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            save_checkpoint(path, agent.checkpoint_state())
+        except OSError:
+            LOGGER.exception("Error writing checkpoint:")
+
+
+async def publish_cred_def(agent, revocation: bool = False):
+    # Create a schema
+    with log_timer("Publish schema/cred def duration:"):
+        log_status("#3/4 Create a new schema/cred def on the ledger")
+        version = format(
+            "%d.%d.%d"
+            % (
+                random.randint(1, 101),
+                random.randint(1, 101),
+                random.randint(1, 101),
+            )
+        )
+        (
+            _,  # schema id
+            credential_definition_id,
+        ) = await agent.register_schema_and_creddef(
+            "custody schema",
+            version,
+            [
+                "issuanceDate",
+                "issuer",
+                "trustFrameworkURI",
+                "auditURI",
+                "appealURI",
+                "caseResult",
+                "credentialSubject.holder.type",
+                "credentialSubject.holder.role",
+                "credentialSubject.holder.rationaleURI",
+                "credentialSubject.holder.firstName",
+                "credentialSubject.holder.lastName",
+                "credentialSubject.holder.kinshipStatus",
+                "credentialSubject.holder.constraints.boundaries",
+                "credentialSubject.holder.constraints.pointOfOrigin",
+                "credentialSubject.holder.constraints.radiusKM",
+                "credentialSubject.holder.constraints.jurisdictions",
+                "credentialSubject.holder.constraints.trigger",
+                "credentialSubject.holder.constraints.circumstances",
+                "credentialSubject.holder.constraints.startTime",
+                "credentialSubject.holder.constraints.endTime",
+                "credentialSubject.proxied.type",
+                "credentialSubject.proxied.firstName",
+                "credentialSubject.proxied.lastName",
+                "credentialSubject.proxied.birthDate",
+                "credentialSubject.proxied.photo",
+                "credentialSubject.proxied.iris",
+                "credentialSubject.proxied.fingerprint",
+                "credentialSubject.holder.permissions"
+            ],
+            support_revocation=revocation,
+        )
+    agent.credential_definition_id = credential_definition_id
+    agent.cred_def_revocation = revocation
+    return credential_definition_id
 
 
 async def main(
@@ -140,105 +558,98 @@ async def main(
         no_auto: bool = False,
         revocation: bool = False,
         show_timing: bool = False,
+        checkpoint_file: str = CHECKPOINT_FILE,
+        genesis_cache_file: str = GENESIS_CACHE_FILE,
+        offline: bool = False,
 ):
-    genesis = await default_genesis_txns()
+    genesis = await load_genesis(genesis_cache_file, offline=offline)
     if not genesis:
-        print("Error retrieving ledger genesis transactions")
+        if offline:
+            print("No valid cached ledger genesis transactions for offline mode")
+        else:
+            print("Error retrieving ledger genesis transactions")
         sys.exit(1)
 
     agent = None
+    checkpointer = None
+    checkpoint = load_checkpoint(checkpoint_file) if checkpoint_file else None
 
     try:
-        log_status("#1 Provision an agent and wallet, get back configuration details")
+        if checkpoint:
+            log_status("#1 Reopen the agent wallet from checkpoint " + checkpoint_file)
+        else:
+            log_status(
+                "#1 Provision an agent and wallet, get back configuration details"
+            )
         agent = CourtAgent(
             start_port,
             start_port + 1,
             genesis_data=genesis,
             no_auto=no_auto,
             timing=show_timing,
+            checkpoint=checkpoint,
         )
         await agent.listen_webhooks(start_port + 2)
-        await agent.register_did()
+        if not agent.did:
+            await agent.register_did()
 
         with log_timer("Startup duration:"):
             await agent.start_process()
         log_msg("Admin URL is at:", agent.admin_url)
         log_msg("Endpoint URL is at:", agent.endpoint)
 
-        # Create a schema
-        with log_timer("Publish schema/cred def duration:"):
-            log_status("#3/4 Create a new schema/cred def on the ledger")
-            version = format(
-                "%d.%d.%d"
-                % (
-                    random.randint(1, 101),
-                    random.randint(1, 101),
-                    random.randint(1, 101),
-                )
+        if not await agent.verify_restored_state():
+            print(
+                "Stale checkpoint: the wallet does not hold the checkpointed DID, "
+                f"remove {checkpoint_file} to start from scratch"
             )
-            (
-                _,  # schema id
-                credential_definition_id,
-            ) = await agent.register_schema_and_creddef(
-                "custody schema",
-                version,
-                [
-                    "issuanceDate",
-                    "issuer",
-                    "trustFrameworkURI",
-                    "auditURI",
-                    "appealURI",
-                    "caseResult",
-                    "credentialSubject.holder.type",
-                    "credentialSubject.holder.role",
-                    "credentialSubject.holder.rationaleURI",
-                    "credentialSubject.holder.firstName",
-                    "credentialSubject.holder.lastName",
-                    "credentialSubject.holder.kinshipStatus",
-                    "credentialSubject.holder.constraints.boundaries",
-                    "credentialSubject.holder.constraints.pointOfOrigin",
-                    "credentialSubject.holder.constraints.radiusKM",
-                    "credentialSubject.holder.constraints.jurisdictions",
-                    "credentialSubject.holder.constraints.trigger",
-                    "credentialSubject.holder.constraints.circumstances",
-                    "credentialSubject.holder.constraints.startTime",
-                    "credentialSubject.holder.constraints.endTime",
-                    "credentialSubject.proxied.type",
-                    "credentialSubject.proxied.firstName",
-                    "credentialSubject.proxied.lastName",
-                    "credentialSubject.proxied.birthDate",
-                    "credentialSubject.proxied.photo",
-                    "credentialSubject.proxied.iris",
-                    "credentialSubject.proxied.fingerprint",
-                    "credentialSubject.holder.permissions"
-                ],
-                support_revocation=revocation,
+            checkpoint_file = None  # leave the checkpoint as it was on disk
+            sys.exit(1)
+
+        if checkpoint_file:
+            checkpointer = asyncio.ensure_future(
+                checkpoint_loop(agent, checkpoint_file, CHECKPOINT_INTERVAL)
             )
 
-        if revocation:
-            with log_timer("Publish revocation registry duration:"):
+        if (
+                agent.credential_definition_id
+                and agent.cred_def_revocation == revocation
+        ):
+            # the cred def and its revocation registry are already on the ledger
+            credential_definition_id = agent.credential_definition_id
+            log_msg("Reusing cred def:", credential_definition_id)
+        else:
+            credential_definition_id = await publish_cred_def(agent, revocation)
+
+            if revocation:
+                with log_timer("Publish revocation registry duration:"):
+                    log_status(
+                        "#5/6 Create and publish the revocation registry on the ledger"
+                    )
+                    await agent.create_and_publish_revocation_registry(
+                        credential_definition_id, TAILS_FILE_COUNT
+                    )
+
+        if await agent.resume_connection():
+            await agent.resume_exchanges()
+        else:
+            with log_timer("Generate invitation duration:"):
+                # Generate an invitation
                 log_status(
-                    "#5/6 Create and publish the revocation registry on the ledger"
-                )
-                await agent.create_and_publish_revocation_registry(
-                    credential_definition_id, TAILS_FILE_COUNT
+                    "#7 Create a connection to alice and print out the invite details"
                 )
+                connection = await agent.admin_POST("/connections/create-invitation")
 
-        with log_timer("Generate invitation duration:"):
-            # Generate an invitation
-            log_status(
-                "#7 Create a connection to alice and print out the invite details"
-            )
-            connection = await agent.admin_POST("/connections/create-invitation")
-
-        agent.connection_id = connection["connection_id"]
+            agent.connection_id = connection["connection_id"]
 
-        log_msg(
-            json.dumps(connection["invitation"]), label="Invitation Data:", color=None
-        )
+            log_msg(
+                json.dumps(connection["invitation"]),
+                label="Invitation Data:",
+                color=None,
+            )
 
-        log_msg("Waiting for connection...")
-        await agent.detect_connection()
+            log_msg("Waiting for connection...")
+            await agent.detect_connection()
 
         exchange_tracing = False
         options = (
@@ -252,8 +663,10 @@ async def main(
                 "    (5) Publish Revocations\n"
                 "    (6) Add Revocation Registry\n"
             )
+        options += "    (B) Broadcast message to connected holders\n"
+        options += "    (M) Search received messages\n"
         options += "    (T) Toggle tracing on credential/proof exchange\n"
-        options += "    (X) Exit?\n[1/2/3/{}T/X] ".format(
+        options += "    (X) Exit?\n[1/2/3/{}B/M/T/X] ".format(
             "4/5/6/" if revocation else ""
         )
         async for option in prompt_loop(options):
@@ -263,6 +676,30 @@ async def main(
             if option is None or option in "xX":
                 break
 
+            elif option in "bB":
+                msg = await prompt("Enter message (e.g. 'Dear $their_label, ...'): ")
+                ids = (
+                    await prompt("Connection ids (comma separated, blank for all): ")
+                ).strip()
+                connection_ids = [i.strip() for i in ids.split(",")] if ids else None
+                try:
+                    result = await agent.broadcast_message(msg, connection_ids)
+                except ValueError as err:
+                    log_msg("Broadcast not sent:", err)
+                    continue
+                log_msg(
+                    "Broadcast delivered to {}, failed for {} in {:.2f}s".format(
+                        result["delivered"], result["failed"], result["duration"]
+                    )
+                )
+                for (connection_id, error) in result["failures"].items():
+                    agent.log("Failed to message", connection_id, ":", error)
+
+            elif option in "mM":
+                text = (await prompt("Search text (blank for all): ")).strip()
+                for entry in agent.search_messages(text):
+                    log_msg(entry["connection_id"], ":", entry["content"])
+
             elif option in "tT":
                 exchange_tracing = not exchange_tracing
                 log_msg(
@@ -377,6 +814,15 @@ async def main(
                     log_msg(line)
 
     finally:
+        if checkpointer:
+            checkpointer.cancel()
+        if agent:
+            await agent.drain_exchanges()
+            if checkpoint_file:
+                try:
+                    save_checkpoint(checkpoint_file, agent.checkpoint_state())
+                except OSError:
+                    LOGGER.exception("Error writing checkpoint:")
         terminated = True
         try:
             if agent:
@@ -662,6 +1108,32 @@ if __name__ == "__main__":
     parser.add_argument(
         "--timing", action="store_true", help="Enable timing information"
     )
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default=CHECKPOINT_FILE,
+        metavar=("<file>"),
+        help="Checkpoint file used to warm restart the agent (empty to disable)",
+    )
+    parser.add_argument(
+        "--genesis-cache",
+        type=str,
+        default=GENESIS_CACHE_FILE,
+        metavar=("<file>"),
+        help=(
+            "Local cache of the ledger genesis transactions (empty to disable); "
+            "copies older than GENESIS_REFRESH_INTERVAL seconds are refreshed "
+            "in the background and used from the next start"
+        ),
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help=(
+            "Only use cached genesis transactions, never fetch or refresh them; "
+            "a refreshed cache from an earlier online run is used as is"
+        ),
+    )
     args = parser.parse_args()
 
     ENABLE_PYDEVD_PYCHARM = os.getenv("ENABLE_PYDEVD_PYCHARM", "").lower()
@@ -696,7 +1168,15 @@ if __name__ == "__main__":
 
     try:
         asyncio.get_event_loop().run_until_complete(
-            main(args.port, args.no_auto, args.revocation, args.timing)
+            main(
+                args.port,
+                args.no_auto,
+                args.revocation,
+                args.timing,
+                args.checkpoint,
+                args.genesis_cache,
+                args.offline,
+            )
         )
     except KeyboardInterrupt:
         os._exit(1)